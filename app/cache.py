@@ -0,0 +1,56 @@
+from collections import OrderedDict
+
+from app.config import get_settings
+
+
+class LRUCache:
+    """
+    A small least-recently-used cache keyed by any hashable value.
+    Once `maxsize` entries are stored, adding a new one evicts the entry used longest ago.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        """
+        Counter bumped on every invalidation. Readers take it before loading a value and pass it to `set`,
+        so a value loaded before a concurrent write is never stored.
+        """
+        return self._version
+
+    def get(self, key):
+        """
+        Return the cached value for `key` and mark it as recently used, or None on a miss.
+        """
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return None
+        return self._data[key]
+
+    def set(self, key, value, version: int):
+        """
+        Store `value` under `key`, evicting the least recently used entry if the cache is full.
+        Nothing is stored if the cache has been invalidated since `version` was read.
+        """
+        if self.maxsize <= 0 or version != self._version:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        """
+        Drop `key` from the cache and reject any value that is still being loaded.
+        """
+        self._data.pop(key, None)
+        self._version += 1
+
+
+# Pre-encoded JSON bodies of single users, keyed by user ID
+user_cache = LRUCache(maxsize=get_settings().USER_CACHE_SIZE)
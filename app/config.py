@@ -1,24 +1,22 @@
 from functools import lru_cache
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
 
 
 class Settings(BaseSettings):
     DATABASE_URL: str = Field(..., description='Database URL')
+    DB_POOL_SIZE: int = Field(20, description='Number of connections kept open in the pool')
+    DB_MAX_OVERFLOW: int = Field(10, description='Extra connections allowed beyond the pool size')
+    DEBUG: bool = Field(False, description='Log every emitted SQL statement')
+    USER_CACHE_SIZE: int = Field(0, description='Number of encoded users kept in memory; 0 disables the cache')
 
     # Optional: You can add other environment variables here
-    class Config:
-        env_file = ".env"  # Specify the .env file location if needed
+    model_config = SettingsConfigDict(env_file=".env")  # Values are read from .env by pydantic-settings
 
 
 @lru_cache()
 def get_settings() -> Settings:
+    """
+    Build the settings on first use and return the same instance afterwards.
+    """
     return Settings()
-
-
-# This will load settings from the .env file and make it available
-setting_loader = get_settings()
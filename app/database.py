@@ -1,15 +1,29 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from contextvars import ContextVar
 
-from app.config import setting_loader
+from sqlalchemy.ext.asyncio import AsyncSession, async_scoped_session, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+
+from app.config import get_settings
 
 # Database configuration
-DATABASE_URL = setting_loader.DATABASE_URL
+settings = get_settings()
+DATABASE_URL = settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+# Create the async SQLAlchemy engine and session
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=30,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+    echo=settings.DEBUG,
+)
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False, class_=AsyncSession)
 
-# Create the SQLAlchemy engine and session
-engine = create_engine(DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Identifies the request being served, so every request gets its own session from the registry
+request_scope = ContextVar("request_scope", default=None)
+ScopedSession = async_scoped_session(SessionLocal, scopefunc=request_scope.get)
 
 # Define the base for SQLAlchemy models
 Base = declarative_base()
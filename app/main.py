@@ -1,285 +1,312 @@
-from fastapi import FastAPI, Depends, status
-from sqlalchemy.orm import Session
-from app.database import Base, SessionLocal, engine
-from app.exception.custom_exception import CustomException, CustomHTTPException
+import logging
+from collections import Counter
+
+from fastapi import Body, FastAPI, Depends, Query, Request, Response, status
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.cache import user_cache
+from app.database import ScopedSession, request_scope
+from app.exception.custom_exception import CustomException
 from app.models import User
 from app.schema.user_schema import CreateUserSchema, GetUserSchema, UpdateUserSchema
 
+logger = logging.getLogger(__name__)
+
 # Create the FastAPI app
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
+# Largest batch accepted by POST /users/bulk; keeps the email IN (...) lookup well below the driver's bind limit
+MAX_BULK_USERS = 1000
 
-# Dependency to get DB session
-def get_db():
-    """
-    Dependency to get a database session.
-    Ensures that the session is properly closed after use.
+# Serializer for user listings, built once so the validator/serializer is compiled only at import
+UserListAdapter = TypeAdapter(list[GetUserSchema])
 
-    Raises:
-        CustomException: If there is an error connecting to the database.
+# Lookup of already registered emails used by the bulk insert; bind the list of emails as "emails"
+REGISTERED_EMAILS_STMT = select(User.email).where(User.email.in_(bindparam("emails", expanding=True)))
+
+
+# Translate application errors raised by any route into their HTTP response
+@app.exception_handler(CustomException)
+async def custom_exception_handler(request: Request, exc: CustomException):
+    """
+    Exception handler for CustomException, so routes can raise it directly without wrapping.
+    """
+    return ORJSONResponse(
+        status_code=exc.status_code,
+        content={
+            "detail": exc.detail,
+            "exception_type": exc.exception_type,
+            "additional_info": exc.additional_info or {},
+        },
+    )
+
+
+# Translate database errors raised by any route into a 500 response
+@app.exception_handler(SQLAlchemyError)
+async def database_exception_handler(request: Request, exc: SQLAlchemyError):
+    """
+    Exception handler for errors raised by SQLAlchemy while serving a request.
+    Keeps error translation off the routes' happy path.
     """
+    logger.error("Database error while serving %s %s", request.method, request.url.path, exc_info=exc)
+    return ORJSONResponse(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        content={
+            "detail": "Error while accessing the database.",
+            "exception_type": "DatabaseError",
+            "additional_info": {},
+        },
+    )
+
+
+# Give every request its own scoped session and release it once the response is ready
+@app.middleware("http")
+async def db_session_middleware(request: Request, call_next):
+    """
+    Middleware that opens a session scope for the request and removes the scoped session afterwards,
+    returning its connection to the pool.
+    """
+    token = request_scope.set(object())
     try:
-        db = SessionLocal()
-        try:
-            yield db
-        finally:
-            db.close()
-    except Exception as e:
-        raise CustomException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error connecting to the database.",
-            exception_type="DatabaseConnectionError",
-            additional_info={"error": str(e)}
-        )
+        return await call_next(request)
+    finally:
+        await ScopedSession.remove()
+        request_scope.reset(token)
 
 
-# Create the table if it does not exist
-@app.on_event("startup")
-def create_tables():
+# Dependency to get DB session
+async def get_db() -> AsyncSession:
     """
-    Event handler to create all tables at the startup of the app.
-    It ensures that all tables defined by the Base metadata are created in the database.
-
-    Raises:
-        CustomException: If there is an error while creating database tables.
+    Dependency to get the database session bound to the current request.
+    The session is closed by `db_session_middleware` once the request is done.
     """
-    try:
-        # Create all tables defined by the Base metadata
-        Base.metadata.create_all(bind=engine)
-    except Exception as e:
-        raise CustomException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error while creating database tables.",
-            exception_type="TableCreationError",
-            additional_info={"error": str(e)}
-        )
+    return ScopedSession()
 
 
-# Route to get all users from the database
+# Route to get a page of users from the database
 @app.get("/users", response_model=list[GetUserSchema])
-def get_users(db: Session = Depends(get_db)):
+async def get_users(
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+):
     """
-    Route to retrieve all users from the database.
+    Route to retrieve a page of users from the database, ordered by ID.
 
     Args:
-        db (Session): The database session.
+        limit (int): The maximum number of users to return.
+        offset (int): The number of users to skip before the page starts.
+        db (AsyncSession): The database session.
 
     Returns:
-        list[GetUserSchema]: A list of all users in the database.
+        list[GetUserSchema]: The requested page of users; empty if there are none.
 
     Raises:
-        CustomHTTPException: If no users are found or if there is an error during retrieval.
+        SQLAlchemyError: If there is an error during retrieval; handled by `database_exception_handler`.
     """
-    try:
-        users = db.query(User).all()
-        if not users:
-            raise CustomException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="No users found in the database.",
-                exception_type="NotFoundError",
-                additional_info={}
-            )
-        return users
-    except CustomException as e:
-        raise CustomHTTPException(
-            status_code=e.status_code,
-            detail=e.detail,
-            exception_type=e.exception_type,
-            additional_info=e.additional_info
-        )
-    except Exception as e:
-        raise CustomHTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error retrieving users from the database.",
-            exception_type="DatabaseError",
-            additional_info={"error": str(e)}
-        )
+    result = await db.scalars(select(User).order_by(User.id).limit(limit).offset(offset))
+    users = UserListAdapter.validate_python(result.all(), from_attributes=True)
+    return Response(content=UserListAdapter.dump_json(users), media_type="application/json")
 
 
 # Route to get a single user by ID from the database
 @app.get("/users/{user_id}", response_model=GetUserSchema)
-def get_user(user_id: int, db: Session = Depends(get_db)):
+async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
     """
     Route to retrieve a single user by their ID.
 
     Args:
         user_id (int): The ID of the user to retrieve.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
 
     Returns:
         GetUserSchema: The user data corresponding to the provided user ID.
 
     Raises:
-        CustomHTTPException: If the user is not found or if there is an error during retrieval.
+        CustomException: If the user is not found.
+        SQLAlchemyError: If there is an error during retrieval; handled by `database_exception_handler`.
     """
-    try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if user is None:
-            raise CustomException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User with the provided ID does not exist.",
-                exception_type="NotFoundError",
-                additional_info={"user_id": user_id}
-            )
-        return user
-    except CustomException as e:
-        raise CustomHTTPException(
-            status_code=e.status_code,
-            detail=e.detail,
-            exception_type=e.exception_type,
-            additional_info=e.additional_info
-        )
-    except Exception as e:
-        raise CustomHTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error retrieving user data from the database.",
-            exception_type="DatabaseError",
-            additional_info={"error": str(e)}
+    # Serve the pre-encoded body when the user has been read recently
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
+    cache_version = user_cache.version
+    user = await db.get(User, user_id)
+    if user is None:
+        raise CustomException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User with the provided ID does not exist.",
+            exception_type="NotFoundError",
+            additional_info={"user_id": user_id}
         )
+    content = GetUserSchema.model_validate(user).model_dump_json().encode()
+    user_cache.set(user_id, content, cache_version)
+    return Response(content=content, media_type="application/json")
 
 
 # Route to add a new user to the database
 @app.post("/users", response_model=GetUserSchema)
-def add_user(user: CreateUserSchema, db: Session = Depends(get_db)):
+async def add_user(user: CreateUserSchema, db: AsyncSession = Depends(get_db)):
     """
     Route to add a new user to the database.
 
     Args:
         user (CreateUserSchema): The user data to create a new user.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
 
     Returns:
         GetUserSchema: The created user data.
 
     Raises:
-        CustomHTTPException: If the email is already registered or if there is an error during the creation process.
+        CustomException: If the email is already registered.
+        SQLAlchemyError: If there is an error during the creation process; handled by `database_exception_handler`.
     """
+    # Create the new user, relying on the unique index to reject duplicate emails
     try:
-        # Check if the email already exists
-        existing_user = db.query(User).filter(User.email == user.email).first()
-        if existing_user:
-            raise CustomException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email is already registered.",
-                exception_type="ConflictError",
-                additional_info={"email": user.email}
-            )
+        async with db.begin():
+            new_user = await db.scalar(insert(User).values(**user.model_dump()).returning(User))
+    except IntegrityError:
+        raise CustomException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email is already registered.",
+            exception_type="ConflictError",
+            additional_info={"email": user.email}
+        )
+    return new_user
+
+
+# Route to add several users to the database in one statement
+@app.post("/users/bulk", response_model=list[GetUserSchema])
+async def add_users(
+    users: list[CreateUserSchema] = Body(..., max_length=MAX_BULK_USERS),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Route to add a batch of users to the database with a single INSERT and a single commit.
+    The duplicate check and the INSERT share one transaction, so its locks are held until the whole batch is written.
+
+    Args:
+        users (list[CreateUserSchema]): The user data to create the new users from, at most `MAX_BULK_USERS` items.
+        db (AsyncSession): The database session.
+
+    Returns:
+        list[GetUserSchema]: The created users, in the order they were submitted.
+
+    Raises:
+        CustomException: If any email is duplicated or already registered.
+        SQLAlchemyError: If there is an error during the creation process; handled by `database_exception_handler`.
+    """
+    if not users:
+        return []
 
-        # Create the new user
-        new_user = User(name=user.name, email=user.email)
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
-        return new_user
-    except CustomException as e:
-        raise CustomHTTPException(
-            status_code=e.status_code,
-            detail=e.detail,
-            exception_type=e.exception_type,
-            additional_info=e.additional_info
+    emails = [user.email for user in users]
+    duplicated = sorted(email for email, count in Counter(emails).items() if count > 1)
+    if duplicated:
+        raise CustomException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Emails must be unique within the batch.",
+            exception_type="ConflictError",
+            additional_info={"emails": duplicated}
         )
-    except Exception as e:
-        raise CustomHTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error while adding the user to the database.",
-            exception_type="DatabaseError",
-            additional_info={"error": str(e)}
+
+    # Check all emails against the database and insert the batch in one transaction
+    try:
+        async with db.begin():
+            registered = (await db.scalars(REGISTERED_EMAILS_STMT, {"emails": emails})).all()
+            if registered:
+                raise CustomException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Email is already registered.",
+                    exception_type="ConflictError",
+                    additional_info={"emails": sorted(registered)}
+                )
+
+            new_users = (await db.scalars(
+                insert(User).returning(User, sort_by_parameter_order=True),
+                [user.model_dump() for user in users],
+            )).all()
+    except IntegrityError:
+        raise CustomException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email is already registered.",
+            exception_type="ConflictError",
+            additional_info={"emails": emails}
         )
+    return new_users
 
 
 # Route to update an existing user by ID
 @app.put("/users/{user_id}", response_model=GetUserSchema)
-def update_user(user_id: int, user: UpdateUserSchema, db: Session = Depends(get_db)):
+async def update_user(user_id: int, user: UpdateUserSchema, db: AsyncSession = Depends(get_db)):
     """
     Route to update an existing user's data by their ID.
 
     Args:
         user_id (int): The ID of the user to update.
         user (UpdateUserSchema): The new data to update the user with.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
 
     Returns:
         GetUserSchema: The updated user data.
 
     Raises:
-        CustomHTTPException: If the user does not exist or if there is an error during the update process.
+        CustomException: If the user does not exist or the email is already registered.
+        SQLAlchemyError: If there is an error during the update process; handled by `database_exception_handler`.
     """
+    # Update the user's fields and read the new row back in the same statement
     try:
-        # Find the existing user
-        existing_user = db.query(User).filter(User.id == user_id).first()
-        if existing_user is None:
-            raise CustomException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User with the provided ID does not exist.",
-                exception_type="NotFoundError",
-                additional_info={"user_id": user_id}
+        async with db.begin():
+            existing_user = await db.scalar(
+                update(User).where(User.id == user_id).values(**user.model_dump()).returning(User)
             )
-
-        # Update the user's fields
-        existing_user.name = user.name
-        existing_user.email = user.email
-
-        db.commit()
-        db.refresh(existing_user)
-        return existing_user
-    except CustomException as e:
-        raise CustomHTTPException(
-            status_code=e.status_code,
-            detail=e.detail,
-            exception_type=e.exception_type,
-            additional_info=e.additional_info
-        )
-    except Exception as e:
-        raise CustomHTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error while updating the user data in the database.",
-            exception_type="DatabaseError",
-            additional_info={"error": str(e)}
+            if existing_user is None:
+                raise CustomException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="User with the provided ID does not exist.",
+                    exception_type="NotFoundError",
+                    additional_info={"user_id": user_id}
+                )
+    except IntegrityError:
+        raise CustomException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email is already registered.",
+            exception_type="ConflictError",
+            additional_info={"email": user.email}
         )
+    user_cache.invalidate(user_id)
+    return existing_user
 
 
 # Route to delete a user by ID
-@app.delete("/users/{user_id}", response_model=GetUserSchema)
-def delete_user(user_id: int, db: Session = Depends(get_db)):
+@app.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT, response_class=Response)
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
     """
     Route to delete a user from the database by their ID.
 
     Args:
         user_id (int): The ID of the user to delete.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
 
     Returns:
-        GetUserSchema: The deleted user data.
+        Response: An empty 204 No Content response.
 
     Raises:
-        CustomHTTPException: If the user does not exist or if there is an error during the deletion process.
+        CustomException: If the user does not exist.
+        SQLAlchemyError: If there is an error during the deletion process; handled by `database_exception_handler`.
     """
-    try:
-        # Find the existing user
-        existing_user = db.query(User).filter(User.id == user_id).first()
-        if existing_user is None:
+    # Delete the user; RETURNING tells us whether a row was removed
+    async with db.begin():
+        deleted_id = await db.scalar(delete(User).where(User.id == user_id).returning(User.id))
+        if deleted_id is None:
             raise CustomException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User with the provided ID does not exist.",
                 exception_type="NotFoundError",
                 additional_info={"user_id": user_id}
             )
-
-        # Delete the user
-        db.delete(existing_user)
-        db.commit()
-        return existing_user
-    except CustomException as e:
-        raise CustomHTTPException(
-            status_code=e.status_code,
-            detail=e.detail,
-            exception_type=e.exception_type,
-            additional_info=e.additional_info
-        )
-    except Exception as e:
-        raise CustomHTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Error while deleting the user from the database.",
-            exception_type="DatabaseError",
-            additional_info={"error": str(e)}
-        )
+    user_cache.invalidate(user_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
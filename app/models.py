@@ -6,4 +6,4 @@ class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), index=True)
-    email = Column(String(255), unique=True, index=True)
+    email = Column(String(255), unique=True, index=True, nullable=False)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, EmailStr
 
 
 # Create Pydantic models for response and request
@@ -7,15 +7,18 @@ class GetUserSchema(BaseModel):
     name: str
     email: str
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class CreateUserSchema(BaseModel):
     name: str
-    email: str
+    email: EmailStr
+
+    model_config = ConfigDict(frozen=True)
 
 
 class UpdateUserSchema(BaseModel):
     name: str
-    email: str
+    email: EmailStr
+
+    model_config = ConfigDict(frozen=True)
@@ -0,0 +1,23 @@
+"""
+One-shot script to create the database tables.
+Run it once per deployment, before starting the API workers:
+
+    python -m scripts.init_db
+"""
+import asyncio
+
+from app.database import Base, engine
+from app import models  # noqa: F401  Registers the models on Base.metadata
+
+
+async def create_tables():
+    """
+    Create all tables defined by the Base metadata that do not exist yet.
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(create_tables())